@@ -0,0 +1,147 @@
+# coding=UTF8
+# Cue sheet for the prompter: one song title (or any other cue) per line.
+
+import os, bisect, difflib, logging
+
+from LedDisplay import encodeText
+
+def _searchKey(title):
+    """Case-insensitive key used for prefix search."""
+    if isinstance(title, bytes):
+        title = title.decode("UTF8", "replace")
+    return title.strip().lower()
+
+class CueSheet:
+    """Loads the cue sheet from a text file and keeps it up to date.
+
+       Lines are stripped of their trailing newline and surrounding whitespace;
+       blank lines are skipped. Cues are numbered from 1 for goto(), while
+       indices (as used by __getitem__ and the prompter cursor) start at 0."""
+
+    def __init__(self, path):
+
+        self._logger = logging.getLogger("CueSheet {!r}".format(path))
+
+        self._path    = path
+        self._stamp   = None
+        self._cues    = []
+        self._encoded = []
+        self._index   = []
+
+        self.reload()
+
+    @staticmethod
+    def _normalise(lines):
+        cues    = []
+        numbers = [] # line number of each cue, for messages
+        for (n, line) in enumerate(lines):
+            line = line.strip()
+            if line:
+                cues.append(line)
+                numbers.append(n + 1)
+        return (cues, numbers)
+
+    def _encode(self, cue, number):
+        try:
+            return encodeText(cue)
+        except UnicodeError:
+            self._logger.warning("Line {}: {!r} has characters the display cannot show, they are replaced by '?'.".format(number, cue))
+            return encodeText(cue, "replace")
+
+    def _stat(self):
+        st = os.stat(self._path)
+        return (st.st_mtime, st.st_size)
+
+    def __len__(self):
+        return len(self._cues)
+
+    def __getitem__(self, index):
+        return self._cues[index]
+
+    def encoded(self, index):
+        """The cue as it is sent to the display (see LedDisplay.encodeText)."""
+        return self._encoded[index]
+
+    def goto(self, number):
+        """Return the index of cue 'number' (counting from 1)."""
+        if isinstance(number, int) and (1 <= number <= len(self._cues)):
+            return number - 1
+        raise ValueError("{} is not a valid cue number.".format(number))
+
+    def find(self, prefix):
+        """Return the indices of all cues starting with 'prefix' (ignoring case), in sheet order."""
+        key = _searchKey(prefix)
+        pos = bisect.bisect_left(self._index, (key, -1))
+        found = []
+        while pos < len(self._index) and self._index[pos][0].startswith(key):
+            found.append(self._index[pos][1])
+            pos += 1
+        return sorted(found)
+
+    def changed(self):
+        """True if the file was modified since it was last loaded."""
+        try:
+            return self._stat() != self._stamp
+        except OSError:
+            return False # Probably being rewritten by an editor, try again later.
+
+    def reload(self, cursor = None):
+        """Re-read the file and update only the cues that actually changed.
+
+           Returns (cursor, changed): the cursor moved along with the cue it
+           pointed to (negative cursors are left alone), and the list of indices
+           of the new or modified cues. If the file cannot be read, or is empty,
+           the previous cues are kept and the reload is retried the next time
+           changed() is checked."""
+
+        try:
+            stamp = self._stat()
+            with open(self._path, "r") as f:
+                (cues, numbers) = self._normalise(f.readlines())
+
+            encoded = []
+            changed = []
+            opcodes = difflib.SequenceMatcher(None, self._cues, cues, autojunk = False).get_opcodes()
+
+            for (tag, i1, i2, j1, j2) in opcodes:
+                if tag == "equal":
+                    encoded.extend(self._encoded[i1:i2])
+                else:
+                    for j in range(j1, j2):
+                        encoded.append(self._encode(cues[j], numbers[j]))
+                        changed.append(j)
+
+        except (EnvironmentError, UnicodeError) as e:
+            if self._stamp is None:
+                raise # Nothing to fall back to.
+            self._logger.warning("Cannot reload, keeping the previous cues: {}".format(e))
+            return (cursor, [])
+
+        if not cues and self._cues:
+            # Editors saving in place (or a shell redirect) truncate the file first.
+            self._logger.warning("File is empty, keeping the previous cues.")
+            return (cursor, [])
+
+        new_cursor = cursor
+
+        for (tag, i1, i2, j1, j2) in opcodes:
+            if cursor is not None and i1 <= cursor < i2:
+                if tag == "equal":
+                    new_cursor = j1 + (cursor - i1)
+                else:
+                    new_cursor = min(j1 + (cursor - i1), max(j2 - 1, j1))
+
+        if cursor is not None and cursor >= len(self._cues):
+            new_cursor = len(cues) - 1
+        if new_cursor is not None and cursor >= 0:
+            new_cursor = max(0, min(new_cursor, len(cues) - 1))
+
+        if changed or len(cues) != len(self._cues):
+            self._logger.info("Reloaded {} cues, {} changed.".format(len(cues), len(changed)))
+
+        self._stamp   = stamp
+        self._cues    = cues
+        self._encoded = encoded
+        self._index   = sorted((_searchKey(cue), i) for (i, cue) in enumerate(cues))
+
+        return (new_cursor, changed)
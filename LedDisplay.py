@@ -3,7 +3,7 @@
 
 # The device has 16 elements of 7 rows x 5 columns == 7 rows x 80 columns
 
-import serial, operator, datetime, functools, re, logging
+import serial, operator, datetime, functools, re, logging, threading, time
 
 class CommunicationError(Exception):
     """This exception is raised if a communication error is detected."""
@@ -24,6 +24,47 @@ Replacements = {
         "ß": "<U5F>",
     }
 
+def encodeText(text, errors = "strict"):
+    """Substitute the special characters the display knows and encode as ASCII.
+       Bytes are passed through unchanged. With errors = "replace", characters
+       the display cannot show become "?" instead of raising UnicodeError."""
+
+    if isinstance(text, str):
+        for (a, b) in Replacements.items():
+            text = text.replace(a, b)
+        if isinstance(text, bytes): # Python 2: UTF-8 encoded str
+            text = text.decode("UTF8", errors)
+        text = text.encode("ASCII", errors)
+
+    return text
+
+def _openPort(device, timeout):
+    return serial.Serial(device, 9600, serial.EIGHTBITS, serial.PARITY_NONE, serial.STOPBITS_ONE, timeout, False, False)
+
+def _transact(port, logger, command, expected_response, max_retry):
+    """Write a command and wait for the expected response, retrying up to "max_retry" times."""
+
+    for i in range(max_retry):
+
+        port.flushInput() # Drop late responses to earlier commands, so they cannot be taken for ours.
+
+        logger.info("Sending to device: {!r}".format(command))
+        port.write(command)
+
+        response = port.read(len(expected_response))
+
+        if response == expected_response:
+            logger.debug("Received expected response: {!r}.".format(response))
+            break # Success!
+
+        response = response + port.read(1000) # Read garbage, if any (will timeout).
+
+        logger.warning("Received unexpected response: {!r}".format(response))
+
+    else:
+        # If we get here, we didn't get an acknowledgement after retries.
+        raise CommunicationError("Command {!r} was not acknowledged by device.".format(command))
+
 class LedDisplay:
 
     DEFAULT_RETRY = 3
@@ -94,7 +135,7 @@ class LedDisplay:
 
         self._logger.debug("Opening serial port ...")
 
-        self._port = serial.Serial(self._device, 9600, serial.EIGHTBITS, serial.PARITY_NONE, serial.STOPBITS_ONE, self._timeout, False, False)
+        self._port = _openPort(self._device, self._timeout)
 
     def __del__(self):
 
@@ -118,13 +159,16 @@ class LedDisplay:
         self._port.close()
         self._port = None
 
+    def _transact(self, command, expected_response, max_retry):
+        _transact(self._port, self._logger, command, expected_response, max_retry)
+
     def send(self, data_packet, max_retry = DEFAULT_RETRY):
         """Assemble standard packet and send command."""
 
-        if isinstance(data_packet, str):
-            for (a, b) in Replacements.items():
-                data_packet = data_packet.replace(a, b)
-            data_packet = data_packet.encode("ASCII")
+        self._sendPacket(encodeText(data_packet), max_retry)
+
+    def _sendPacket(self, data_packet, max_retry = DEFAULT_RETRY):
+        """Like send(), but for binary data that must not go through encodeText()."""
 
         assert isinstance(data_packet, bytes)
 
@@ -142,26 +186,7 @@ class LedDisplay:
         print "TX:[" + command + "]"
         expected_response = "ACK".encode("ASCII")
 
-        # Try up to "max_retry" times...
-
-        for i in range(max_retry):
-
-            self._logger.info("Sending to device: {!r}".format(command))
-            self._port.write(command)
-
-            response = self._port.read(3)
-
-            if response == expected_response:
-                self._logger.debug("Received expected response: {!r}.".format(response))
-                break # Success!
-
-            response = response + self._port.read(1000) # Read garbage, if any (will timeout).
-
-            self._logger.warning("Received unexpected response: {!r}".format(response))
-
-        else:
-            # If we get here, we didn't get an ACK after retries.
-            raise CommunicationError("Command {!r} was not acknowledged by device.".format(command))
+        self._transact(command, expected_response, max_retry)
 
     def setDeviceId(self, new_device_id, max_retry = DEFAULT_RETRY):
         """Paragraph 4.1: ID setting.
@@ -172,25 +197,7 @@ class LedDisplay:
 
         expected_response = "{:02X}".format(new_device_id).encode("ASCII")
 
-        # Try up to "max_retry" times...
-
-        for i in range(max_retry):
-
-            self._logger.info("Sending to device: {!r}".format(command))
-            self._port.write(command)
-
-            response = self._port.read(2)
-
-            if response == expected_response:
-                self._logger.debug("Received expected response: {!r}.".format(response))
-                break # Success!
-
-            response = response + self._port.read(1000) # Read garbage, if any (will timeout).
-            self._logger.warning("Received unexpected response: {!r}.".format(response))
-
-        else:
-            # If we get here, we didn't get an acknowledgement.
-            raise CommunicationError("Command {!r} was not acknowledged by device.".format(command))
+        self._transact(command, expected_response, max_retry)
 
     def setRealtimeClock(self, timestamp = None):
         """ Paragraph 4.2.1: Real Time Clock Setting"""
@@ -401,9 +408,9 @@ class LedDisplay:
         print("v -->", gr)
 
         command_prefix = "<G{}{}>".format(self._checkGraphicsPage(graphicsPage), self._checkGraphicsBlock(graphicsBlock)).encode("ASCII")
-        command = command_prefix + bytes(gr)
+        command = command_prefix + bytes(bytearray(gr))
 
-        self.send(command)
+        self._sendPacket(command)
 
     def deletePage(self, line, page):
         """Paragraph 4.2.5.1: Delete page"""
@@ -446,3 +453,161 @@ class LedDisplay:
         """Paragraph 4.2.9: Recall factory default European char table"""
         command = "<DU>"
         self.send(command)
+
+class LedBusDisplay(LedDisplay):
+    """A display on a shared LedBus. Behaves like LedDisplay, but does not own a port.
+
+       Device ID 0 is the broadcast address: every sign on the bus executes the
+       command, and none of them acknowledges it."""
+
+    BROADCAST_ID = 0
+
+    def __init__(self, bus, device_id):
+
+        self._logger = logging.getLogger("LedDisplay {!r} ID {}".format(bus._device, device_id))
+
+        self._bus       = bus
+        self._device    = bus._device
+        self._device_id = device_id if device_id == self.BROADCAST_ID else self._checkDeviceId(device_id)
+        self._timeout   = bus._timeout
+        self._port      = None # The port belongs to the bus.
+
+    def close(self):
+        """Nothing to do; close the bus to close the port."""
+        pass
+
+    def reaches(self):
+        """The displays that execute commands sent through this handle. For the
+           broadcast handle, these are the ones handed out by the bus so far;
+           signs on the line that never got a handle are not known."""
+        if self._device_id == self.BROADCAST_ID:
+            return self._bus._addressed()
+        return [self]
+
+    def _transact(self, command, expected_response, max_retry):
+        if self._device_id == self.BROADCAST_ID:
+            self._bus._broadcast(command)
+        else:
+            self._bus._transact(command, expected_response, max_retry)
+
+    def setDeviceId(self, new_device_id, max_retry = LedDisplay.DEFAULT_RETRY):
+        """The "set ID" command carries no ID, so on a shared line every sign would take the new ID.
+           Assign IDs with each sign connected on its own."""
+        raise ValueError("Cannot set the device ID of a sign on a shared bus.")
+
+class LedBus:
+    """Several displays with different device IDs sharing one serial port (RS-485 multi-drop).
+
+       Transactions (command and acknowledgement) are run one at a time, in the
+       order they were requested, so displays driven from different threads take
+       turns on the line and each ACK is read by the command that caused it."""
+
+    BROADCAST_SETTLE = 0.1 # seconds; broadcasts are not acknowledged, give the signs time to process them.
+
+    def __init__(self, device, timeout = 1.0):
+
+        self._logger = logging.getLogger("LedBus {!r}".format(device))
+
+        self._device   = device
+        self._timeout  = timeout
+        self._displays = {}
+
+        self._turn        = threading.Condition()
+        self._next_ticket = 0
+        self._now_serving = 0
+        self._abandoned   = set() # tickets whose holder gave up waiting
+
+        self._logger.debug("Opening serial port ...")
+
+        self._port = _openPort(self._device, self._timeout)
+
+    def __del__(self):
+
+        if self._port is not None:
+            self._logger.error("The __del__ method of class LedBus was called while the serial port was still open. Please use explicit close() method.")
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._port is not None:
+            self.close()
+
+    def close(self):
+
+        assert self._port is not None
+
+        self._logger.debug("Closing serial port ...")
+
+        self._port.close()
+        self._port = None
+
+    def display(self, device_id):
+        """Return the display handle for 'device_id' (1..8)."""
+        return self._handle(LedDisplay._checkDeviceId(device_id))
+
+    def broadcast(self):
+        """Return a display handle whose commands are executed by all signs on the bus."""
+        return self._handle(LedBusDisplay.BROADCAST_ID)
+
+    def _handle(self, device_id):
+        with self._turn:
+            if device_id not in self._displays:
+                self._displays[device_id] = LedBusDisplay(self, device_id)
+            return self._displays[device_id]
+
+    def _addressed(self):
+        with self._turn:
+            return [d for (i, d) in self._displays.items() if i != LedBusDisplay.BROADCAST_ID]
+
+    def _acquire(self):
+        # Ticket lock: first come, first served.
+        with self._turn:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            try:
+                while ticket != self._now_serving:
+                    self._turn.wait()
+            except:
+                # E.g. KeyboardInterrupt while waiting: give the ticket up, or the line stays blocked.
+                if ticket == self._now_serving:
+                    self._advance()
+                else:
+                    self._abandoned.add(ticket)
+                raise
+
+    def _release(self):
+        with self._turn:
+            self._advance()
+
+    def _advance(self):
+        # Called with self._turn held.
+        self._now_serving += 1
+        while self._now_serving in self._abandoned:
+            self._abandoned.remove(self._now_serving)
+            self._now_serving += 1
+        self._turn.notify_all()
+
+    def _transact(self, command, expected_response, max_retry):
+
+        assert self._port is not None
+
+        self._acquire()
+        try:
+            _transact(self._port, self._logger, command, expected_response, max_retry)
+        finally:
+            self._release()
+
+    def _broadcast(self, command):
+
+        assert self._port is not None
+
+        self._acquire()
+        try:
+            self._logger.info("Broadcasting: {!r}".format(command))
+            self._port.write(command)
+            self._port.flush() # Wait until it is on the line ...
+            time.sleep(self.BROADCAST_SETTLE) # ... and processed, before the next transaction starts.
+        finally:
+            self._release()
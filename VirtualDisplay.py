@@ -0,0 +1,237 @@
+# coding=UTF8
+# One wide logical display made of several AM03127 signs mounted side by side.
+
+import re, logging
+
+from LedDisplay import LedDisplay, LedBusDisplay, encodeText
+
+# Column advance per character of the fonts selected with <AA>, <AB> and <AC>.
+FontWidths = {
+        "A": 6,
+        "B": 7,
+        "C": 5,
+    }
+
+_token = re.compile(r"<[A-Z][0-9A-Z]{1,2}>|.", re.S)
+
+class PanelError(Exception):
+    """Raised when a command to one of the panels fails.
+       'panel' is its index (from the left), 'error' the original exception."""
+
+    def __init__(self, panel, error):
+        Exception.__init__(self, "Panel {} failed: {!r}".format(panel, error))
+        self.panel = panel
+        self.error = error
+
+class VirtualDisplay:
+    """Composes several displays (left to right) into one canvas.
+
+       Content is split across the panels and staged into the page that is not
+       currently shown; commit() then switches all panels to it with one
+       run-page command each, so the panels change (almost) simultaneously.
+       If 'commit' is a LedBus.broadcast() handle, the run-page switch is sent
+       once through it instead of to every panel. A broadcast switches every
+       sign on the bus, so this is only done while the panels are exactly the
+       displays handed out by that bus; the bus must not carry other signs.
+
+       Bitmaps for run page A use graphics page A, those for run page B graphics
+       page B, so staging a bitmap never touches the one on screen."""
+
+    COLUMNS = 80 # per panel
+    ROWS    = 7
+    PAGES   = "AB"
+
+    BLOCK_COLUMNS = 32 # per graphics block
+
+    IMMEDIATE = "<FA><MA><WA><FA>"
+    SCROLL    = "<FE><MA><WD><FE>" # for text that does not fit, shown on every panel
+    NARROW    = "<AC>"
+
+    def __init__(self, panels, commit = None, line = 1):
+
+        self._logger = logging.getLogger("VirtualDisplay")
+
+        self._broadcast = commit
+        self._line      = line
+
+        self.setPanels(panels)
+
+    def setPanels(self, panels):
+        """Replace the displays (e.g. after a reconnect). Which page they show is
+           unknown then, so the run page is sent again before the next staging."""
+
+        self._panels = list(panels)
+        self._shown  = None
+
+        if self._broadcast is not None and not self._broadcastReachesPanels():
+            self._logger.warning("The commit handle does not reach exactly the panels, switching them one by one.")
+
+    def _broadcastReachesPanels(self):
+        if not isinstance(self._broadcast, LedBusDisplay):
+            return False
+        return sorted(map(id, self._broadcast.reaches())) == sorted(map(id, self._panels))
+
+    @property
+    def columns(self):
+        return self.COLUMNS * len(self._panels)
+
+    def _onPanel(self, n, method, *args):
+        try:
+            getattr(self._panels[n], method)(*args)
+        except Exception as e:
+            raise PanelError(n, e)
+
+    def _sync(self):
+        if self._shown is None:
+            for n in range(len(self._panels)):
+                self._onPanel(n, "setDefaultRunPage", self.PAGES[0])
+            self._shown = self.PAGES[0]
+
+    def _hiddenPage(self):
+        self._sync()
+        return self.PAGES[(self.PAGES.index(self._shown) + 1) % len(self.PAGES)]
+
+    def splitText(self, text):
+        """Split text into one piece per panel, by rendered width, at spaces.
+           Font and color directives are repeated at the start of the next panel.
+           Returns None if the text does not fit."""
+
+        text = encodeText(text).decode("ASCII")
+
+        # Words as lists of (token, width); each word is preceded by a space of 'gaps[n]' columns.
+
+        words = [[]]
+        gaps  = [0]
+        width = FontWidths["A"]
+
+        for token in _token.findall(text):
+            if token == " ":
+                words.append([])
+                gaps.append(width)
+            elif len(token) == 1 or token.startswith("<U"):
+                words[-1].append((token, width))
+            else:
+                if token[1] == "A":
+                    width = FontWidths.get(token[2], FontWidths["A"])
+                words[-1].append((token, 0))
+
+        pieces = [[]]
+        carry  = {}
+        used   = 0
+
+        for (gap, word) in zip(gaps, words):
+
+            if not word:
+                continue
+
+            wordWidth = sum(w for (t, w) in word)
+            if used == 0:
+                gap = 0
+
+            if used > 0 and used + gap + wordWidth > self.COLUMNS:
+                if len(pieces) == len(self._panels):
+                    return None
+                pieces.append([carry[k] for k in sorted(carry)])
+                used = 0
+                gap  = 0
+
+            if used + gap + wordWidth > self.COLUMNS:
+                return None # A single word wider than a panel.
+
+            if gap:
+                pieces[-1].append(" ")
+
+            for (token, w) in word:
+                if w == 0 and token[1] in "AC":
+                    carry[token[1]] = token
+                pieces[-1].append(token)
+
+            used += gap + wordWidth
+
+        pieces.extend([[]] * (len(self._panels) - len(pieces)))
+
+        return ["".join(piece).encode("ASCII") for piece in pieces]
+
+    def splitGraphics(self, rows):
+        """Split a bitmap (ROWS strings of "RGBO." pixels, up to 'columns' wide)
+           into the graphics blocks of each panel."""
+
+        assert len(rows) == self.ROWS
+
+        rows = [row.replace(".", "B").ljust(self.columns, "B") for row in rows]
+
+        blocksPerPanel = -(-self.COLUMNS // self.BLOCK_COLUMNS)
+
+        panels = []
+        for p in range(len(self._panels)):
+            blocks = []
+            for b in range(blocksPerPanel):
+                start = p * self.COLUMNS + b * self.BLOCK_COLUMNS
+                stop  = min(start + self.BLOCK_COLUMNS, (p + 1) * self.COLUMNS)
+                blocks.append("".join(row[start:stop].ljust(self.BLOCK_COLUMNS, "B") for row in rows))
+            panels.append(blocks)
+
+        return panels
+
+    def _stagePage(self, n, page, content, effects = IMMEDIATE):
+        command = "<L{}><P{}>{}".format(LedDisplay._checkLine(self._line), LedDisplay._checkPage(page), effects).encode("ASCII")
+        self._onPanel(n, "send", command + content)
+
+    def stageText(self, text):
+        """Write text to the hidden page of all panels; call commit() to show it.
+           Text too wide for the panels is tried in the narrow font, and if it
+           still does not fit, scrolled on every panel."""
+
+        page = self._hiddenPage()
+        text = encodeText(text)
+
+        pieces = self.splitText(text)
+        if pieces is None:
+            pieces = self.splitText(self.NARROW.encode("ASCII") + text)
+
+        if pieces is None:
+            self._logger.debug("Text does not fit, scrolling: {!r}".format(text))
+            for n in range(len(self._panels)):
+                self._stagePage(n, page, text, self.SCROLL)
+        else:
+            for (n, piece) in enumerate(pieces):
+                self._stagePage(n, page, piece)
+
+    def stageGraphics(self, rows):
+        """Write a bitmap to the hidden page of all panels; call commit() to show it."""
+
+        page = self._hiddenPage()
+
+        for (n, blocks) in enumerate(self.splitGraphics(rows)):
+            content = ""
+            for (i, block) in enumerate(blocks):
+                self._onPanel(n, "setGraphicsBlock", page, i + 1, block)
+                content += "<G{}{}>".format(page, i + 1)
+            self._stagePage(n, page, content.encode("ASCII"))
+
+    def commit(self):
+        """Switch all panels to the staged page.
+           If a panel fails, PanelError tells which one."""
+
+        page = self._hiddenPage()
+
+        self._logger.debug("Switching to page {}.".format(page))
+
+        # If this fails partway, the panels show different pages; _sync() sorts that out.
+        self._shown = None
+
+        if self._broadcast is not None and self._broadcastReachesPanels():
+            self._broadcast.setDefaultRunPage(page)
+        else:
+            for n in range(len(self._panels)):
+                self._onPanel(n, "setDefaultRunPage", page)
+
+        self._shown = page
+
+    def showText(self, text):
+        self.stageText(text)
+        self.commit()
+
+    def showGraphics(self, rows):
+        self.stageGraphics(rows)
+        self.commit()
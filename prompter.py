@@ -1,12 +1,16 @@
 # coding=UTF8
 
 from LedDisplay import LedDisplay
+from CueSheet import CueSheet
+from VirtualDisplay import VirtualDisplay, PanelError
 import sys
 import time
 import os
 import readchar
 
 
+DEFAULT_SCRIPT = "/home/pi/LEDPrompter/script.txt"
+
 def main():
 
     def connectDisplay(deviceName):
@@ -25,41 +29,65 @@ def main():
             print("problem deleting device " + deviceName)
         return connectDisplay(deviceName)
 
-    def secureSend(display, deviceName, command):
+    def secureShow(wide, displays, text):
         try:
-            display.send(command)
-            return display
+            wide.showText(text)
+        except PanelError as e:
+            print("Unexpected error on " + devicePaths[e.panel])
+            displays[e.panel] = reconnectDisplay(displays[e.panel], devicePaths[e.panel])
+            wide.setPanels(displays)
         except:
             print("Unexpected error")
-            display = reconnectDisplay(display, deviceName)
-        return display
 
 
 
-    devicePath1 = "/dev/ttyUSB0"
-    devicePath2 = "/dev/ttyUSB1"
+    # The signs hang side by side, left to right, and form one wide display.
+    devicePaths = ["/dev/ttyUSB0", "/dev/ttyUSB1"]
 
-    ledz1 = connectDisplay(devicePath1)
-    ledz2 = connectDisplay(devicePath2)
+    displays = [connectDisplay(devicePath) for devicePath in devicePaths]
+    wide = VirtualDisplay(displays)
 
-    ledz1 = secureSend(ledz1, devicePath1, "<L1><PA><FE><MA><WA><FE>Start")
-    ledz2 = secureSend(ledz2, devicePath2, "<L1><PA><FE><MA><WA><FE>Start")
+    secureShow(wide, displays, "Start")
     #time.sleep(1)
     #ledz.send("<L1><PA><FA><MA><WA><FE>")
     #time.sleep(1)
 
-    f = open('/home/pi/LEDPrompter/script.txt', 'r')
-    lines = f.readlines()
+    scriptPath = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("LEDPROMPTER_SCRIPT", DEFAULT_SCRIPT)
+    lines = CueSheet(scriptPath)
+
+    def readSearch():
+        """Read a cue number or title prefix; "" if cancelled (ESC, Ctrl-C or empty)."""
+        text = ""
+        while True:
+            c = readchar.readkey()
+            if c == readchar.key.ENTER:
+                return text
+            if c == readchar.key.ESC or c == readchar.key.CTRL_C:
+                return ""
+            if c == readchar.key.BACKSPACE:
+                text = text[:-1]
+            elif len(c) == 1:
+                text = text + c
+            print("search: " + text)
 
     i = -2
     while True:
-        print("===========> wait for key (x=escape)  <=============")
+        print("===========> wait for key (x=escape, /=search)  <=============")
         key = readchar.readkey()
 
         print(key)
         if key == 'x':
             break
 
+        if lines.changed():
+            i, changed = lines.reload(i)
+            if changed:
+                print("script changed, cues " + ", ".join(str(n + 1) for n in changed))
+
+        if len(lines) == 0:
+            print("script is empty")
+            continue
+
         command = ""
         if key == readchar.key.RIGHT or key == readchar.key.PAGE_DOWN or key == "m" or key == "M":
             i = i+1
@@ -81,32 +109,49 @@ def main():
                 i = 0
             command = lines[i]
 
+        if key == "/":
+            text = readSearch()
+            if text == "":
+                print("search cancelled")
+                continue
+            if text.isdigit():
+                try:
+                    i = lines.goto(int(text))
+                except ValueError:
+                    print("no cue " + text)
+                    continue
+            else:
+                found = lines.find(text)
+                if not found:
+                    print("no cue starting with " + text)
+                    continue
+                i = found[0]
+            command = lines[i]
+
         if command == "":
             continue
 
-        try:
-            if (command != "erase"):
-                ledz1 = secureSend(ledz1, devicePath1, "<L1><PA><FE><MA><WD><FE>"+command)
-                ledz2 = secureSend(ledz2, devicePath2, "<L1><PA><FE><MA><WD><FE>"+command)
+        if (command != "erase"):
+            secureShow(wide, displays, lines.encoded(i))
 
-                time.sleep(10)
+            # While the cue is up, an edit to it is shown right away.
+            end = time.time() + 10
+            while time.time() < end:
+                time.sleep(0.5)
+                if lines.changed():
+                    i, changed = lines.reload(i)
+                    if i in changed:
+                        secureShow(wide, displays, lines.encoded(i))
 
-            ledz1 = secureSend(ledz1, devicePath1, "<L1><PA><FA><MA><WA><FA>")
-            ledz2 = secureSend(ledz2, devicePath2, "<L1><PA><FA><MA><WA><FA>")
-        except:
-            print("Unexpected error")
-            ledz1 = reconnectDisplay(ledz1, "/dev/ttyUSB0")
-            ledz2 = reconnectDisplay(ledz2, "/dev/ttyUSB1")
+        secureShow(wide, displays, "")
 
 
-    ledz1 = secureSend(ledz1, devicePath1, "<L1><PA><FA><MA><WD><FE>Ende")
-    ledz2 = secureSend(ledz2, devicePath2, "<L1><PA><FA><MA><WD><FE>Ende")
+    secureShow(wide, displays, "Ende")
     time.sleep(1)
-    ledz1.close()
-    ledz2.close()
+    for display in displays:
+        display.close()
 
-    del ledz1
-    del ledz2
+    del displays
 
 
 if __name__ == "__main__":
@@ -0,0 +1,265 @@
+# coding=UTF8
+# Tests that run without hardware: the serial port is replaced by FakePort.
+# Run with:  python -m unittest test_LedPrompter
+
+import sys, os, types, shutil, tempfile, unittest, logging, threading, time
+
+try:
+    import serial
+except ImportError:
+    serial = types.ModuleType("serial") # Only the constants are used; _openPort is replaced below.
+    serial.EIGHTBITS = serial.PARITY_NONE = serial.STOPBITS_ONE = None
+    sys.modules["serial"] = serial
+
+import LedDisplay
+from CueSheet import CueSheet
+from VirtualDisplay import VirtualDisplay, PanelError
+
+logging.disable(logging.CRITICAL)
+
+def native(text):
+    """Text as the prompter passes it around: UTF-8 encoded str on Python 2."""
+    return text.encode("UTF8") if bytes is str else text
+
+class FakePort:
+    """Records what is written and answers like a sign: "ACK", or the ID for <ID><nn><E>."""
+
+    def __init__(self, device = None, timeout = None):
+        self.written = []
+        self.pending = b""
+
+    def write(self, command):
+        self.written.append(command)
+        if command.startswith(b"<ID><"):
+            self.pending += command[5:7]
+        elif not command.startswith(b"<ID00>"):
+            self.pending += b"ACK"
+
+    def read(self, n):
+        (response, self.pending) = (self.pending[:n], self.pending[n:])
+        return response
+
+    def flushInput(self):
+        self.pending = b""
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+LedDisplay._openPort = FakePort
+
+class CueSheetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir  = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "script.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, text):
+        with open(self.path, "w") as f:
+            f.write(text)
+        os.utime(self.path, (0, os.stat(self.path).st_mtime + 1)) # Make sure changed() sees it.
+
+    def testNormaliseAndIndex(self):
+        self.write("Alpha\n\n  Beta  \nGamma\nbeta two\n")
+        cues = CueSheet(self.path)
+        self.assertEqual([cues[i] for i in range(len(cues))], ["Alpha", "Beta", "Gamma", "beta two"])
+        self.assertEqual(cues.goto(3), 2)
+        self.assertRaises(ValueError, cues.goto, 5)
+        self.assertEqual(cues.find("BE"), [1, 3])
+        self.assertEqual(cues.find("x"), [])
+
+    def testCursorFollowsCue(self):
+        self.write("A\nB\nC\nD\n")
+        cues = CueSheet(self.path)
+        self.write("Intro\nA\nB\nC two\nD\n")
+        self.assertTrue(cues.changed())
+        self.assertEqual(cues.reload(1), (2, [0, 3])) # B moved down by one
+        self.write("Intro\nA\nB\nC two\nD\n")
+        self.assertEqual(cues.reload(3), (3, [])) # C two itself, unchanged
+        self.write("Intro\nA\nD\n")
+        self.assertEqual(cues.reload(3), (2, [])) # deleted: next cue
+        self.assertEqual(cues.reload(-2), (-2, [])) # before the first cue
+
+    def testUnknownCharacterIsReplaced(self):
+        self.write(native(u"Caf\xe9 del Mar\nYour\u2019re the voice\nR\xfcckenwind\n"))
+        cues = CueSheet(self.path)
+        self.assertEqual(len(cues), 3)
+        self.assertEqual(cues.encoded(0), b"Caf? del Mar")
+        self.assertEqual(cues.encoded(1), b"Your?re the voice")
+        self.assertEqual(cues.encoded(2), b"R<U7C>ckenwind")
+
+    def testEmptyOrMissingFileKeepsCues(self):
+        self.write("A\nB\n")
+        cues = CueSheet(self.path)
+        self.write("")
+        self.assertEqual(cues.reload(1), (1, []))
+        self.assertEqual(len(cues), 2)
+        os.remove(self.path)
+        self.assertFalse(cues.changed())
+        self.assertEqual(cues.reload(1), (1, []))
+        self.assertEqual(len(cues), 2)
+
+class LedBusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = LedDisplay.LedBus("/dev/fake")
+        self.bus.BROADCAST_SETTLE = 0
+        self.port = self.bus._port
+
+    def tearDown(self):
+        self.bus.close()
+
+    def waitForTickets(self, n):
+        for i in range(1000):
+            if self.bus._next_ticket == n:
+                return
+            time.sleep(0.001)
+        self.fail("ticket {} never taken".format(n))
+
+    def sendFromThread(self, device_id, text):
+        thread = threading.Thread(target = self.bus.display(device_id).send, args = (text,))
+        thread.daemon = True # A bus that never frees up must fail the test, not hang it.
+        thread.start()
+        return thread
+
+    def testHandles(self):
+        self.assertTrue(self.bus.display(3) is self.bus.display(3))
+        self.assertTrue(self.bus.broadcast() is self.bus.broadcast())
+        self.assertRaises(ValueError, self.bus.display, 9)
+        self.assertRaises(ValueError, self.bus.display(3).setDeviceId, 4)
+
+    def testAddressingAndAck(self):
+        self.bus.display(2).deleteAll()
+        self.assertEqual(self.port.written, [b"<ID02><D*>6C<E>"])
+        self.port.pending = b"ACK" # a late ACK must not be taken for the next command
+        self.port.write = lambda command: self.port.written.append(command)
+        self.assertRaises(LedDisplay.CommunicationError, self.bus.display(2).send, "<D*>", 1)
+
+    def testFirstComeFirstServed(self):
+        self.bus._acquire()
+        threads = []
+        for (n, (device_id, text)) in enumerate([(1, "a"), (2, "b"), (1, "c")]):
+            threads.append(self.sendFromThread(device_id, text))
+            self.waitForTickets(n + 2)
+        self.bus._release()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual([command[6:7] for command in self.port.written], [b"a", b"b", b"c"])
+        self.assertEqual([command[:6] for command in self.port.written], [b"<ID01>", b"<ID02>", b"<ID01>"])
+
+    def testInterruptedWaiterDoesNotBlockTheBus(self):
+        self.bus._acquire()
+
+        def interrupted():
+            raise KeyboardInterrupt()
+        self.bus._turn.wait = interrupted
+        self.assertRaises(KeyboardInterrupt, self.bus._acquire)
+        del self.bus._turn.wait
+
+        thread = self.sendFromThread(1, "a")
+        self.waitForTickets(3)
+        self.bus._release()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.port.written, [b"<ID01>a61<E>"])
+
+    def testBroadcastIsNotAcknowledged(self):
+        self.bus.broadcast().setDefaultRunPage("B")
+        self.bus.display(1).setDefaultRunPage("B")
+        self.assertEqual(self.port.written, [b"<ID00><RPB>42<E>", b"<ID01><RPB>42<E>"])
+
+class VirtualDisplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.panels = [LedDisplay.LedDisplay("/dev/left"), LedDisplay.LedDisplay("/dev/right")]
+        self.wide   = VirtualDisplay(self.panels)
+
+    def tearDown(self):
+        for panel in self.panels:
+            panel.close()
+
+    def written(self, n):
+        return [command[6:-5] for command in self.panels[n]._port.written]
+
+    def testSplitAtWords(self):
+        split = self.wide.splitText
+        self.assertEqual(split("Leben mit Herz"), [b"Leben mit", b"Herz"]) # 14 x 6 columns > 80
+        self.assertEqual(split("Agnus Dei"), [b"Agnus Dei", b""])
+        self.assertEqual(split(native(u"Das w\xfcnsch ich dir")), [b"Das w<U7C>nsch", b"ich dir"])
+        self.assertEqual(split(native(u"Herr, gib mir Mut zum Br\xfccken bauen")), None)
+        self.assertEqual(split("x" * 14), None) # one word wider than a panel
+
+    def testDirectivesAndFontWidth(self):
+        split = self.wide.splitText
+        self.assertEqual(split("<CB>aaaaaaaaaa bbb <AB>cc dd"), [b"<CB>aaaaaaaaaa", b"<CB>bbb <AB>cc dd"])
+        self.assertEqual(split("<AC>" + "x" * 16), [b"<AC>" + b"x" * 16, b""]) # 16 x 5 == 80
+        self.assertEqual(split("<AB>" + "x" * 12), None) # 12 x 7 > 80
+
+    def testFallbacks(self):
+        self.wide.showText("Just a little talk with jesus")
+        self.assertEqual(self.written(0)[-2:], [b"<L1><PB><FA><MA><WA><FA><AC>Just a little", b"<RPB>"])
+        self.assertEqual(self.written(1)[-2:], [b"<L1><PB><FA><MA><WA><FA><AC>talk with jesus", b"<RPB>"])
+        self.wide.showText("Brich mit dem Hungrigen dein Brot")
+        for n in range(2):
+            self.assertEqual(self.written(n)[-2:], [b"<L1><PA><FE><MA><WD><FE>Brich mit dem Hungrigen dein Brot", b"<RPA>"])
+
+    def testSplitGraphics(self):
+        rows = ["R" * 40 + "G" * 120] * 7
+        panels = self.wide.splitGraphics(rows)
+        self.assertEqual([len(blocks) for blocks in panels], [3, 3])
+        self.assertEqual(panels[0][0], "R" * 32 * 7)
+        self.assertEqual(panels[0][1], ("R" * 8 + "G" * 24) * 7)
+        self.assertEqual(panels[0][2], ("G" * 16 + "B" * 16) * 7) # columns 64..79, padded
+        self.assertEqual(panels[1][2], ("G" * 16 + "B" * 16) * 7)
+
+    def testStagingUsesHiddenPages(self):
+        self.wide.showGraphics(["R" * 160] * 7)
+        self.wide.showGraphics(["G" * 160] * 7)
+        pages = [command[:5] for command in self.written(0)]
+        self.assertEqual(pages, [b"<RPA>",                                       # first sync
+                                 b"<GB1>", b"<GB2>", b"<GB3>", b"<L1><", b"<RPB>",
+                                 b"<GA1>", b"<GA2>", b"<GA3>", b"<L1><", b"<RPA>"])
+
+    def testFailedPanelIsReported(self):
+        self.wide.showText("A")
+        port = self.panels[1]._port
+        write = port.write
+        def noAckForRunPage(command):
+            if b"<RP" in command:
+                port.written.append(command)
+            else:
+                write(command)
+        port.write = noAckForRunPage # fails in commit(), after the left panel switched
+        try:
+            self.wide.showText("B")
+            self.fail("PanelError not raised")
+        except PanelError as e:
+            self.assertEqual(e.panel, 1)
+            self.assertTrue(isinstance(e.error, LedDisplay.CommunicationError))
+
+        del port.write
+        self.panels[0]._port.written = []
+        self.wide.showText("C") # state unknown: switch back to A, stage on B
+        self.assertEqual(self.written(0), [b"<RPA>", b"<L1><PB><FA><MA><WA><FA>C", b"<RPB>"])
+
+    def testBroadcastCommitOnlyForOwnBus(self):
+        bus = LedDisplay.LedBus("/dev/bus")
+        try:
+            panels = [bus.display(1), bus.display(2)]
+            wide = VirtualDisplay(panels, commit = bus.broadcast())
+            wide.showText("A")
+            self.assertEqual(bus._port.written[-1], b"<ID00><RPB>42<E>")
+
+            bus.display(3) # another sign on the same line
+            wide.showText("B")
+            self.assertEqual(bus._port.written[-2:], [b"<ID01><RPA>41<E>", b"<ID02><RPA>41<E>"])
+        finally:
+            bus.close()
+
+if __name__ == "__main__":
+    unittest.main()